@@ -6,5 +6,9 @@ __author__ = """Paul Hallett"""
 __email__ = 'paulandrewhallett@gmail.com'
 __version__ = '0.1.0'
 
+from .archive import AbstractArchive, FileArchive  # noqa
 from .block import Block  # noqa
+from .compression import LzmaCodec, ZlibCodec, train_dictionary  # noqa
 from .record import AbstractBlockRecord, BlockRecordRedis  # noqa
+from .record import verify_blocks  # noqa
+from .stream import export_chain, import_chain  # noqa
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from abc import ABC, abstractmethod
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from .stream import read_blocks, write_blocks
+
+"""Archives for old Blocks moved out of the primary persistence."""
+
+
+class AbstractArchive(ABC):
+    """
+    AbstractArchive stores segments of old <Block>s, for rolling your own
+    archive beneath a compacted BlockRecord.
+
+    A segment is a list of frames, each a short list of consecutive
+    Blocks, so one Block can be read without reading its whole segment.
+    A segment is written once, when it is compacted, and only read after.
+    """
+
+    @abstractmethod
+    def write_segment(self, *, segment_id, frames):
+        """
+        Store a list of frames, each a list of <Block>s, as the segment
+        segment_id. The segment must be durable once this returns, as the
+        Blocks are then deleted from the primary persistence.
+        """
+
+    @abstractmethod
+    def read_frame(self, *, segment_id, frame):
+        """
+        Get the list of <Block>s in one frame of the segment segment_id.
+        """
+
+    @abstractmethod
+    def find_block(self, *, uuid):
+        """
+        Find an archived <Block> by its uuid. Returns the id of its segment
+        and its position in the segment, or None if it is not archived.
+        """
+
+
+class FileArchive(AbstractArchive):
+    """
+    FileArchive stores each segment as a gzipped newline-delimited JSON
+    file in a directory, in the same format as export_chain.
+
+    Each frame is a separate gzip member, and a small index file next to
+    the segment holds the offset of every frame and the uuid of every
+    Block, so Blocks can be found without keeping their uuids elsewhere.
+    """
+
+    def __init__(self, *, directory):
+        """
+        Args:
+            directory: The directory segment files are stored in.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, segment_id):
+        return os.path.join(self.directory, '{}.ndjson.gz'.format(segment_id))
+
+    def _index_path(self, segment_id):
+        return os.path.join(self.directory, '{}.idx'.format(segment_id))
+
+    def _write_atomically(self, path, write):
+        """
+        Writes a file through a temporary file renamed into place, so a
+        file is never seen half written.
+
+        The file and the directory are synced to disk before this returns,
+        as the Blocks may be deleted from Redis straight after.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self._sync_directory()
+
+    def _sync_directory(self):
+        """
+        Syncs the directory, so renames into it survive a power loss.
+        """
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _read_index(self, segment_id):
+        with open(self._index_path(segment_id), 'rb') as f:
+            return json.loads(f.read().decode('utf-8'))
+
+    def write_segment(self, *, segment_id, frames):
+        index = {
+            'offsets': [0],
+            'uuids': [
+                str(block.uuid) for blocks in frames for block in blocks
+            ],
+        }
+
+        def write_frames(f):
+            for blocks in frames:
+                write_blocks(blocks, f, use_gzip=True)
+                index['offsets'].append(f.tell())
+
+        self._write_atomically(self._path(segment_id), write_frames)
+        self._write_atomically(
+            self._index_path(segment_id),
+            lambda f: f.write(json.dumps(index).encode('utf-8'))
+        )
+
+    def read_frame(self, *, segment_id, frame):
+        offsets = self._read_index(segment_id)['offsets']
+        with open(self._path(segment_id), 'rb') as f:
+            f.seek(offsets[frame])
+            member = f.read(offsets[frame + 1] - offsets[frame])
+        return list(read_blocks(io.BytesIO(gzip.decompress(member))))
+
+    def find_block(self, *, uuid):
+        """
+        Reads the index of each segment, newest first, until the uuid is
+        found.
+        """
+        segment_ids = sorted(
+            (name[:-len('.idx')] for name in os.listdir(self.directory)
+             if name.endswith('.idx')),
+            reverse=True
+        )
+        for segment_id in segment_ids:
+            uuids = self._read_index(segment_id)['uuids']
+            if uuid in uuids:
+                return segment_id, uuids.index(uuid)
+        return None
+
+    def read_segment(self, *, segment_id):
+        """
+        Get every <Block> in the segment segment_id.
+        """
+        with open(self._path(segment_id), 'rb') as f:
+            return list(read_blocks(f, use_gzip=True))
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+import argparse
+import sys
+import time
+
+from .archive import FileArchive
+from .record import BATCH_SIZE, FRAME_SIZE, BlockRecordRedis, verify_blocks
+from .sampling import DEFAULT_TAMPER_FRACTION
+from .stream import export_chain, import_chain, read_blocks
+
+"""Console script for blockrecord."""
+
+
+def _redis_record(args):
+    try:
+        from redis import RedisError, StrictRedis
+    except ImportError:
+        raise SystemExit('The redis package is required: pip install redis')
+    archive = None
+    if args.archive_dir:
+        archive = FileArchive(directory=args.archive_dir)
+    try:
+        return BlockRecordRedis(
+            persistence=StrictRedis.from_url(args.redis_url), archive=archive
+        )
+    except RedisError as e:
+        raise SystemExit('Cannot read the chain from Redis: {}'.format(e))
+
+
+def _open(path, mode):
+    """
+    Opens a binary file, or stdin/stdout for '-'.
+    """
+    if path == '-':
+        if 'r' in mode:
+            return sys.stdin.buffer
+        return sys.stdout.buffer
+    return open(path, mode)
+
+
+def _close(stream):
+    """
+    Closes a file opened by _open, leaving stdin and stdout open.
+    """
+    if stream not in (None, sys.stdin.buffer, sys.stdout.buffer):
+        stream.close()
+
+
+def _use_gzip(args):
+    return args.gzip or args.file.endswith('.gz')
+
+
+def _report(action, count, started):
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed else 0
+    print(
+        '{} {} blocks in {:.2f}s ({:.0f} blocks/s)'.format(
+            action, count, elapsed, rate
+        ),
+        file=sys.stderr
+    )
+
+
+def export_command(args):
+    started = time.perf_counter()
+    stream = None
+    try:
+        record = _redis_record(args)
+        stream = _open(args.file, 'wb')
+        count = export_chain(
+            record, stream,
+            use_gzip=_use_gzip(args), batch_size=args.batch_size
+        )
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e))
+    finally:
+        _close(stream)
+    _report('Exported', count, started)
+
+
+def import_command(args):
+    started = time.perf_counter()
+    stream = None
+    try:
+        record = _redis_record(args)
+        stream = _open(args.file, 'rb')
+        count = import_chain(
+            record, stream,
+            use_gzip=_use_gzip(args), batch_size=args.batch_size
+        )
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e))
+    finally:
+        _close(stream)
+    _report('Imported', count, started)
+
+
+def verify_sample_command(args):
+    started = time.perf_counter()
+    try:
+        record = _redis_record(args)
+        result = record.verify_chain_sample(
+            sample_size=args.sample_size,
+            confidence=args.confidence,
+            tamper_fraction=args.tamper_fraction,
+            batch_size=args.batch_size
+        )
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e))
+    _report('Spot-checked', result['sample_size'], started)
+    print(
+        'Detection probability {:.4f} if {:.2%} of {} blocks '
+        'are tampered with'.format(
+            result['detection_probability'],
+            result['tamper_fraction'],
+            result['chain_length']
+        ),
+        file=sys.stderr
+    )
+
+
+def verify_command(args):
+    if args.sample_size is not None or args.confidence is not None:
+        if args.file:
+            raise SystemExit('Sampled verification needs the stored chain')
+        return verify_sample_command(args)
+    started = time.perf_counter()
+    stream = None
+    count = 0
+    try:
+        if args.file:
+            stream = _open(args.file, 'rb')
+            blocks = read_blocks(stream, use_gzip=_use_gzip(args))
+        else:
+            record = _redis_record(args)
+            blocks = record.iter_blocks(batch_size=args.batch_size)
+        for _ in verify_blocks(blocks):
+            count += 1
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e))
+    finally:
+        _close(stream)
+    if not count:
+        raise SystemExit('There are no blocks to verify')
+    _report('Verified', count, started)
+
+
+def compact_command(args):
+    if args.before_index is None and args.keep_last is None:
+        raise SystemExit('Either --before-index or --keep-last is needed')
+    if not args.archive_dir:
+        raise SystemExit('--archive-dir is needed to compact the chain')
+    started = time.perf_counter()
+    try:
+        record = _redis_record(args)
+        count = record.compact(
+            before_index=args.before_index,
+            keep_last=args.keep_last,
+            segment_size=args.segment_size,
+            frame_size=args.frame_size
+        )
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e))
+    _report('Archived', count, started)
+
+
+def reindex_command(args):
+    started = time.perf_counter()
+    try:
+        record = _redis_record(args)
+        count = record.reindex_chain(batch_size=args.batch_size)
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e))
+    _report('Reindexed', count, started)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='blockrecord',
+        description='Export, import and verify BlockRecord chains.'
+    )
+    parser.add_argument(
+        '--redis-url', default='redis://localhost:6379/0',
+        help='Redis instance holding the chain.'
+    )
+    parser.add_argument(
+        '--archive-dir',
+        help='Directory of archive segments for a compacted chain.'
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=BATCH_SIZE,
+        help='Blocks read or written per round trip.'
+    )
+    parser.add_argument(
+        '--gzip', action='store_true',
+        help='Compress or decompress with gzip. Implied by a .gz file.'
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    export = subparsers.add_parser(
+        'export', help='Write the chain as newline-delimited JSON.'
+    )
+    export.add_argument('file', nargs='?', default='-')
+    export.set_defaults(func=export_command)
+
+    import_ = subparsers.add_parser(
+        'import', help='Verify and store newline-delimited JSON blocks.'
+    )
+    import_.add_argument('file', nargs='?', default='-')
+    import_.set_defaults(func=import_command)
+
+    verify = subparsers.add_parser(
+        'verify', help='Verify an exported file, or the stored chain.'
+    )
+    verify.add_argument('file', nargs='?', default='')
+    verify.add_argument(
+        '--sample-size', type=int,
+        help='Spot-check this many random blocks of the stored chain.'
+    )
+    verify.add_argument(
+        '--confidence', type=float,
+        help='Spot-check enough blocks to find tampering with this '
+             'probability.'
+    )
+    verify.add_argument(
+        '--tamper-fraction', type=float, default=DEFAULT_TAMPER_FRACTION,
+        help='Fraction of tampered blocks to report detection for.'
+    )
+    verify.set_defaults(func=verify_command)
+
+    compact = subparsers.add_parser(
+        'compact', help='Move old blocks from Redis into --archive-dir.'
+    )
+    compact.add_argument(
+        '--before-index', type=int,
+        help='Archive every block before this chain position.'
+    )
+    compact.add_argument(
+        '--keep-last', type=int,
+        help='Keep this many of the most recent blocks in Redis.'
+    )
+    compact.add_argument(
+        '--segment-size', type=int, default=BATCH_SIZE,
+        help='Blocks stored in each archive segment.'
+    )
+    compact.add_argument(
+        '--frame-size', type=int, default=FRAME_SIZE,
+        help='Blocks read together from an archive segment.'
+    )
+    compact.set_defaults(func=compact_command)
+
+    reindex = subparsers.add_parser(
+        'reindex', help='Rebuild the chain order of an older stored chain.'
+    )
+    reindex.set_defaults(func=reindex_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+from abc import ABC, abstractmethod
+import base64
+import hashlib
+import json
+import lzma
+import time
+import zlib
+
+"""Compression of Block data payloads."""
+
+# Payloads smaller than this many bytes are stored raw by default.
+DEFAULT_THRESHOLD = 256
+
+CONTEXT_CODEC_KEY = 'data_codec'
+CONTEXT_PAYLOAD_KEY = 'data_payload'
+
+# Bytes '"data": ' adds around raw data in a stored context.
+RAW_FIELD_OVERHEAD = len('"data": ')
+
+
+class CompressionStats:
+    """
+    Running totals of the work a codec has done, so the compression
+    ratio and the CPU time spent can be reported.
+    """
+
+    def __init__(self):
+        self.records_compressed = 0
+        self.records_raw = 0
+        self.records_decompressed = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.compress_seconds = 0.0
+        self.decompress_seconds = 0.0
+
+    def __repr__(self):
+        return '<CompressionStats ratio={:.2f} compressed={} raw={}>'.format(
+            self.ratio, self.records_compressed, self.records_raw
+        )
+
+    @property
+    def ratio(self):
+        """
+        Bytes the data fields would take stored raw, divided by the bytes
+        they take as stored. Higher is better.
+        """
+        if not self.stored_bytes:
+            return 1.0
+        return self.raw_bytes / self.stored_bytes
+
+    def to_context(self):
+        return {
+            'records_compressed': self.records_compressed,
+            'records_raw': self.records_raw,
+            'records_decompressed': self.records_decompressed,
+            'raw_bytes': self.raw_bytes,
+            'stored_bytes': self.stored_bytes,
+            'ratio': self.ratio,
+            'compress_seconds': self.compress_seconds,
+            'decompress_seconds': self.decompress_seconds,
+        }
+
+
+class AbstractCodec(ABC):
+    """
+    AbstractCodec compresses the JSON encoding of a Block's data.
+
+    Only the stored representation changes: Blocks always carry their
+    logical data, so hashes are computed exactly as they are without
+    compression.
+    """
+
+    name = None
+
+    def __init__(self, *, threshold=DEFAULT_THRESHOLD, dictionary=None):
+        """
+        Args:
+            threshold: Payloads smaller than this many bytes are stored raw.
+            dictionary: Optional preset dictionary (bytes) shared by every
+                record written with this codec.
+        """
+        self.threshold = threshold
+        self.dictionary = dictionary
+        self.stats = CompressionStats()
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__, self.tag)
+
+    @property
+    def tag(self):
+        """
+        The tag stored alongside each compressed record. Codecs with a
+        dictionary include a fingerprint of it so records are never
+        decompressed with the wrong one.
+        """
+        if self.dictionary:
+            return '{}:{}'.format(
+                self.name, hashlib.sha256(self.dictionary).hexdigest()[:12]
+            )
+        return self.name
+
+    @abstractmethod
+    def _compress(self, raw):
+        """
+        Compress raw bytes and return the compressed bytes.
+        """
+
+    @abstractmethod
+    def _decompress(self, payload):
+        """
+        Decompress bytes produced by self._compress.
+        """
+
+    def encode_data(self, data):
+        """
+        Returns the context fields used to store data. Data below the
+        threshold, or whose stored fields would not shrink, is stored raw.
+
+        Sizes are measured on the JSON fields as they are stored, so the
+        base64 encoding and the codec tag count against compression.
+        """
+        raw = json.dumps(data).encode('utf-8')
+        raw_size = len(raw) + RAW_FIELD_OVERHEAD
+        self.stats.raw_bytes += raw_size
+        if len(raw) < self.threshold:
+            self.stats.records_raw += 1
+            self.stats.stored_bytes += raw_size
+            return {'data': data}
+        start = time.perf_counter()
+        payload = self._compress(raw)
+        self.stats.compress_seconds += time.perf_counter() - start
+        fields = {
+            CONTEXT_CODEC_KEY: self.tag,
+            CONTEXT_PAYLOAD_KEY: base64.b64encode(payload).decode('ascii'),
+        }
+        # The fields as they appear in the context, without its braces
+        stored_size = len(json.dumps(fields)) - len('{}')
+        if stored_size >= raw_size:
+            self.stats.records_raw += 1
+            self.stats.stored_bytes += raw_size
+            return {'data': data}
+        self.stats.records_compressed += 1
+        self.stats.stored_bytes += stored_size
+        return fields
+
+    def decode_data(self, payload):
+        """
+        Returns the logical data from a stored base64 payload.
+        """
+        start = time.perf_counter()
+        raw = self._decompress(base64.b64decode(payload))
+        self.stats.decompress_seconds += time.perf_counter() - start
+        self.stats.records_decompressed += 1
+        return json.loads(raw.decode('utf-8'))
+
+
+class ZlibCodec(AbstractCodec):
+    """
+    ZlibCodec compresses data with zlib, optionally using a trained
+    preset dictionary.
+    """
+
+    name = 'zlib'
+
+    def __init__(self, *, level=6, **kwargs):
+        super().__init__(**kwargs)
+        self.level = level
+
+    def _compress(self, raw):
+        if self.dictionary:
+            compressor = zlib.compressobj(self.level, zdict=self.dictionary)
+        else:
+            compressor = zlib.compressobj(self.level)
+        return compressor.compress(raw) + compressor.flush()
+
+    def _decompress(self, payload):
+        if self.dictionary:
+            decompressor = zlib.decompressobj(zdict=self.dictionary)
+        else:
+            decompressor = zlib.decompressobj()
+        return decompressor.decompress(payload) + decompressor.flush()
+
+
+class LzmaCodec(AbstractCodec):
+    """
+    LzmaCodec compresses data with lzma. It is slower than zlib but
+    usually compresses larger payloads further.
+
+    The lzma module does not support preset dictionaries.
+    """
+
+    name = 'lzma'
+
+    def __init__(self, *, preset=6, threshold=DEFAULT_THRESHOLD):
+        super().__init__(threshold=threshold)
+        self.preset = preset
+
+    def _compress(self, raw):
+        return lzma.compress(raw, format=lzma.FORMAT_XZ, preset=self.preset)
+
+    def _decompress(self, payload):
+        return lzma.decompress(payload, format=lzma.FORMAT_XZ)
+
+
+def train_dictionary(samples, *, size=32 * 1024):
+    """
+    Builds a zlib preset dictionary from a list of sample data.
+
+    zlib matches against the dictionary like recently seen input, so the
+    dictionary is the JSON encoding of the samples, truncated to the
+    last `size` bytes. Pick samples that look like the data you store.
+    """
+    encoded = b''.join(
+        json.dumps(sample).encode('utf-8') for sample in samples
+    )
+    return encoded[-size:]
+
+
+def default_codecs():
+    """
+    Codecs that can always be read without extra configuration.
+    """
+    return [ZlibCodec(), LzmaCodec()]
@@ -1,9 +1,22 @@
 # -*- coding: utf-8 -*-
 from abc import ABC, abstractmethod
+import bisect
+import hashlib
 import json
 import os
+import random
 
 from .block import Block
+from .compression import (
+    CONTEXT_CODEC_KEY,
+    CONTEXT_PAYLOAD_KEY,
+    default_codecs,
+)
+from .sampling import (
+    DEFAULT_TAMPER_FRACTION,
+    detection_probability,
+    sample_size_for_confidence,
+)
 
 """Main module."""
 
@@ -12,6 +25,71 @@ STORAGE_KEY_CURRENT_UUID = os.environ.get(
     'BLOCK_RECORD_CURRENT_BLOCK_UUID',
     'BLOCK_RECORD_CURRENT_BLOCK_UUID'
 )
+# A hash of chain position to Block uuid, so any position is found in O(1).
+STORAGE_KEY_CHAIN = os.environ.get('BLOCK_RECORD_CHAIN', 'BLOCK_RECORD_CHAIN')
+# The number of positions in the chain, which new positions are taken from.
+STORAGE_KEY_CHAIN_LENGTH = os.environ.get(
+    'BLOCK_RECORD_CHAIN_LENGTH',
+    'BLOCK_RECORD_CHAIN_LENGTH'
+)
+# A hash of archive segment id to the checkpoint it is verified against.
+STORAGE_KEY_ARCHIVE_SEGMENTS = os.environ.get(
+    'BLOCK_RECORD_ARCHIVE_SEGMENTS',
+    'BLOCK_RECORD_ARCHIVE_SEGMENTS'
+)
+STORAGE_KEY_ARCHIVE_HEIGHT = os.environ.get(
+    'BLOCK_RECORD_ARCHIVE_HEIGHT',
+    'BLOCK_RECORD_ARCHIVE_HEIGHT'
+)
+
+# How many blocks are read or written per round trip in bulk operations.
+BATCH_SIZE = 500
+
+# How many blocks are read together from an archive segment.
+FRAME_SIZE = 16
+
+
+def verify_blocks(blocks, *, previous_hash=None):
+    """
+    Yields each <Block> from an iterable once it has been verified, so
+    a chain can be checked while it streams past.
+
+    Each block's hash must match its recorded hash, and its previous_hash
+    must be the hash of the block before it.
+
+    Args:
+        blocks: An iterable of <Block> instances in chain order.
+        previous_hash: The hash of the block before the first one, if the
+            blocks continue an existing chain.
+    """
+    for index, block in enumerate(blocks):
+        hsh = block.hash(block.nonce)
+        if block.hsh and block.hsh != hsh:
+            raise ValueError(
+                'Block {} at index {} does not match its hash'.format(
+                    block.uuid, index
+                )
+            )
+        if index or previous_hash:
+            if block.previous_hash != previous_hash:
+                raise ValueError(
+                    'Blockchain is broken at UUID {}, index {}'.format(
+                        block.uuid, index
+                    )
+                )
+        previous_hash = hsh
+        yield block
+
+
+def _frame_digest(blocks):
+    """
+    A digest of the hashes of a frame of archived <Block>s, computed from
+    their data so any change to an archived Block changes it.
+    """
+    message = hashlib.sha256()
+    for block in blocks:
+        message.update(block.hash(block.nonce).encode('utf-8'))
+    return message.hexdigest()
 
 
 class AbstractBlockRecord(ABC):
@@ -20,14 +98,30 @@ class AbstractBlockRecord(ABC):
     own persistence layer beneath the BlockRecord.
     """
 
-    def __init__(self, *, persistence, chain=None):
+    def __init__(
+        self, *,
+        persistence,
+        chain=None,
+        compression=None,
+        extra_codecs=None
+    ):
         """
         Args:
             persistence: The datastore you are persisting block records in.
             chain: A list of <Block> instances in the chain.
+            compression: An optional codec used to compress Block data
+                when it is stored.
+            extra_codecs: Codecs needed to read records written with other
+                settings, such as an older compression dictionary.
         """
         self.persistence = persistence
         self.chain = chain or []
+        self.compression = compression
+        self.codecs = {}
+        for codec in default_codecs() + list(extra_codecs or []):
+            self.codecs[codec.tag] = codec
+        if compression:
+            self.codecs[compression.tag] = compression
         self.current_block_uuid = self._get_current_block_uuid()
         if self.current_block_uuid:
             self.current_block = self._generate_current_block()
@@ -67,6 +161,89 @@ class AbstractBlockRecord(ABC):
         Dump all blocks in the current chain into the database.
         """
 
+    def save_blocks_to_db(self, *, blocks):
+        """
+        Save a batch of <Block>s, in chain order, in the persistence.
+
+        Returns the positions in the chain the blocks were saved at.
+        Backends should override this to write the batch in fewer round
+        trips and without keeping the blocks in self.chain.
+        """
+        start = self.chain_length()
+        for block in blocks:
+            self.save_block_to_db(block=block)
+        return list(range(start, start + len(blocks)))
+
+    def remove_blocks(self, *, heights):
+        """
+        Removes the <Block>s this record saved at positions in the chain,
+        such as the batches left by an import that failed part way.
+
+        Backends should override this to remove the stored Blocks too.
+        """
+        for height in sorted(heights, reverse=True):
+            del self.chain[height]
+
+    def iter_blocks(self, *, start=0, batch_size=BATCH_SIZE):
+        """
+        Yields the <Block>s in the chain in order, from the start index.
+
+        Backends should override this to read from the persistence in
+        batches of batch_size.
+        """
+        for block in self.chain[start:]:
+            yield block
+
+    def chain_length(self):
+        """
+        The number of <Block>s in the chain.
+        """
+        return len(self.chain)
+
+    def get_blocks_by_index(self, *, indexes):
+        """
+        Get the <Block>s at positions in the chain, in the order given.
+
+        Backends should override this to read all of them in as few
+        round trips as possible.
+        """
+        return [self.chain[index] for index in indexes]
+
+    def _block_to_context(self, *, block):
+        """
+        The context stored for a <Block>, with its data compressed if
+        self.compression is set.
+        """
+        context = block.to_context()
+        if self.compression:
+            del context['data']
+            context.update(self.compression.encode_data(block.data))
+        return context
+
+    def _block_from_context(self, *, context):
+        """
+        Builds a <Block> from a stored context, decompressing its data
+        with the codec it was tagged with.
+        """
+        if CONTEXT_CODEC_KEY in context:
+            tag = context[CONTEXT_CODEC_KEY]
+            if tag not in self.codecs:
+                raise ValueError(
+                    'No codec for tag {} on Block {}'.format(
+                        tag, context['uuid']
+                    )
+                )
+            data = self.codecs[tag].decode_data(context[CONTEXT_PAYLOAD_KEY])
+        else:
+            data = context['data']
+        return Block(
+            uuid=context['uuid'],
+            data=data,
+            previous_hash=context['previous_hash'],
+            nonce=context['nonce'],
+            hsh=context['hsh']
+        )
+
     def create_new_block(self, *, data):
         """
         Creates a brand new <Block> instance with the data and returns it.
@@ -115,12 +292,120 @@ class AbstractBlockRecord(ABC):
                 )
         return True
 
+    def verify_chain_sample(
+        self, *,
+        sample_size=None,
+        confidence=None,
+        tamper_fraction=DEFAULT_TAMPER_FRACTION,
+        batch_size=BATCH_SIZE,
+        rng=None
+    ):
+        """
+        Spot-checks random <Block>s instead of the entire chain. Each
+        sampled block's hash is verified, along with its previous_hash
+        link to the block before it.
+
+        Args:
+            sample_size: How many blocks to check.
+            confidence: Instead of sample_size, check enough blocks to
+                find tampering with at least this probability.
+            tamper_fraction: The fraction of tampered blocks that the
+                detection probability is reported for.
+            batch_size: How many blocks are fetched per batched read.
+            rng: The random.Random used to pick blocks. Defaults to
+                random.SystemRandom, so the sample cannot be predicted.
+
+        Returns a dict with the sample size and the detection probability
+        achieved. Raises a ValueError if a broken block is found.
+        """
+        chain_length = self.chain_length()
+        if not chain_length:
+            raise ValueError('There are no Blocks to verify')
+        if sample_size is None:
+            if confidence is None:
+                raise ValueError('Either sample_size or confidence is needed')
+            sample_size = sample_size_for_confidence(
+                chain_length=chain_length,
+                confidence=confidence,
+                tamper_fraction=tamper_fraction
+            )
+        sample_size = min(sample_size, chain_length)
+        rng = rng or random.SystemRandom()
+        sample = sorted(rng.sample(range(chain_length), sample_size))
+        for start in range(0, len(sample), batch_size):
+            indexes = sample[start:start + batch_size]
+            # Fetch each sampled block with the block before it
+            to_fetch = sorted(
+                set(indexes) | {index - 1 for index in indexes if index}
+            )
+            blocks = dict(zip(
+                to_fetch, self.get_blocks_by_index(indexes=to_fetch)
+            ))
+            for index in indexes:
+                self._verify_sampled_block(
+                    block=blocks[index], prev_block=blocks.get(index - 1)
+                )
+        return {
+            'chain_length': chain_length,
+            'sample_size': sample_size,
+            'tamper_fraction': tamper_fraction,
+            'detection_probability': detection_probability(
+                chain_length=chain_length,
+                sample_size=sample_size,
+                tamper_fraction=tamper_fraction
+            ),
+        }
+
+    def _verify_sampled_block(self, *, block, prev_block):
+        """
+        Checks a <Block>'s hash and, if it has one, the link to the block
+        before it.
+        """
+        if block.hsh and block.hsh != block.hash(block.nonce):
+            raise ValueError('Block {} does not match its hash'.format(
+                block.uuid
+            ))
+        if prev_block is None:
+            return
+        prev_hash = prev_block.hash(prev_block.nonce)
+        if prev_block.hsh and prev_block.hsh != prev_hash:
+            raise ValueError('Block {} does not match its hash'.format(
+                prev_block.uuid
+            ))
+        if block.previous_hash != prev_hash:
+            raise ValueError(
+                'Blockchain is broken at UUID {}'.format(block.uuid)
+            )
+
 
 class BlockRecordRedis(AbstractBlockRecord):
     """
     BlockRecordRedis stores Blocks in Redis.
+
+    Old Blocks can be compacted into an archive. Redis then keeps only
+    one checkpoint per archive segment, which the Blocks read back from
+    the archive are verified against.
     """
 
+    def __init__(self, *, archive=None, **kwargs):
+        """
+        Args:
+            archive: An optional <AbstractArchive> that old Blocks are
+                compacted into and read back from.
+
+        Other arguments are passed to AbstractBlockRecord.
+        """
+        self.archive = archive
+        self._archived_height_seen = 0
+        self._segment_starts_seen = []
+        super().__init__(**kwargs)
+
+    def _storage_key(self, uuid):
+        """
+        The Redis key a <Block> is stored under.
+        """
+        return '{}::{}'.format(STORAGE_KEY, str(uuid))
+
     def _get_current_block_uuid(self):
         """
         This BlockRecord uses Redis and we search for the
@@ -137,51 +422,475 @@ class BlockRecordRedis(AbstractBlockRecord):
         """
         Gets the Block data out of Redis.
         """
-        result = self.persistence.get(
-            '{}::{}'.format(STORAGE_KEY, self.current_block_uuid)
-        )
-        block_data = json.loads(result)
-        return Block(
-            uuid=block_data['uuid'],
-            data=block_data['data'],
-            previous_hash=block_data['previous_hash'],
-            nonce=block_data['nonce'],
-            hsh=block_data['hsh']
-        )
+        return self.get_block(uuid=self.current_block_uuid)
 
     def dump_blocks_to_db(self):
         """
-        Stores all the blocks in self.chain in the database.
+        Stores all the blocks in self.chain in the database, at their
+        positions in the stored chain order.
+
+        self.chain must start with every Block already stored, so no stored
+        Block is replaced by a different one. Raises a ValueError if it does
+        not, or if the stored chain has been compacted.
         """
-        for block in self.chain:
-            context = block.to_context()
-            storage_key = '{}::{}'.format(STORAGE_KEY, str(block.uuid))
-            self.persistence.set(storage_key, json.dumps(context))
+        if not self.chain:
+            return
+        if self.archived_height():
+            raise ValueError(
+                'The stored chain is compacted, '
+                'save new Blocks with save_blocks_to_db'
+            )
+        # Checked before the transaction, as it may scan every key
+        self.chain_length()
+        contexts = [
+            json.dumps(self._block_to_context(block=block))
+            for block in self.chain
+        ]
+
+        def dump(pipeline):
+            length = int(pipeline.get(STORAGE_KEY_CHAIN_LENGTH) or 0)
+            if length > len(self.chain):
+                raise ValueError('The chain is shorter than the stored chain')
+            if length:
+                uuids = pipeline.hmget(STORAGE_KEY_CHAIN, list(range(length)))
+                for height, uuid in enumerate(uuids):
+                    if uuid is None or (
+                        uuid.decode('utf-8') != str(self.chain[height].uuid)
+                    ):
+                        raise ValueError(
+                            'The chain does not match the stored chain at '
+                            'index {}'.format(height)
+                        )
+            pipeline.multi()
+            for height, block in enumerate(self.chain):
+                pipeline.set(self._storage_key(block.uuid), contexts[height])
+                pipeline.hset(STORAGE_KEY_CHAIN, height, str(block.uuid))
+            pipeline.set(STORAGE_KEY_CHAIN_LENGTH, len(self.chain))
+
+        self.persistence.transaction(dump, STORAGE_KEY_CHAIN_LENGTH)
 
     def save_block_to_db(self, *, block):
         """
-        Stores a <Block> in Redis.
+        Stores a <Block> in Redis, after the last Block in the stored chain
+        order. Like chain_length, this raises a ValueError for a chain
+        stored without a chain order.
         """
-        context = block.to_context()
-        storage_key = '{}::{}'.format(STORAGE_KEY, str(block.uuid))
-        self.persistence.set(storage_key, json.dumps(context))
+        self._append_blocks(blocks=[block])
         self.current_block_uuid = block.uuid
         self.current_block = block
         self.chain.append(block)
 
+    def _append_blocks(self, *, blocks):
+        """
+        Stores <Block>s after the last Block in the stored chain order, and
+        returns the positions they were stored at.
+
+        The positions are taken in a transaction that watches the chain
+        length, so two writers never store Blocks at the same position.
+        """
+        # Checked before the transaction, as it may scan every key
+        self.chain_length()
+        contexts = [
+            json.dumps(self._block_to_context(block=block))
+            for block in blocks
+        ]
+        heights = []
+
+        def append(pipeline):
+            length = int(pipeline.get(STORAGE_KEY_CHAIN_LENGTH) or 0)
+            heights[:] = range(length, length + len(blocks))
+            pipeline.multi()
+            for height, block, context in zip(heights, blocks, contexts):
+                pipeline.set(self._storage_key(block.uuid), context)
+                pipeline.hset(STORAGE_KEY_CHAIN, height, str(block.uuid))
+            pipeline.set(STORAGE_KEY_CHAIN_LENGTH, length + len(blocks))
+
+        self.persistence.transaction(append, STORAGE_KEY_CHAIN_LENGTH)
+        return heights
+
     def get_block(self, *, uuid):
         """
         Get a <Block> instance from its uuid.
         """
-        storage_key = '{}::{}'.format(STORAGE_KEY, str(uuid))
-        result = self.persistence.get(
-            storage_key
+        return self._get_blocks(uuids=[str(uuid)])[0]
+
+    def _get_blocks(self, *, uuids):
+        """
+        Gets <Block>s from their uuids with one MGET, reading any that
+        have been compacted from the archive.
+        """
+        results = self.persistence.mget(
+            [self._storage_key(uuid) for uuid in uuids]
         )
-        block_data = json.loads(result)
-        return Block(
-            uuid=block_data['uuid'],
-            data=block_data['data'],
-            previous_hash=block_data['previous_hash'],
-            nonce=block_data['nonce'],
-            hsh=block_data['hsh']
+        missing = [
+            uuid for uuid, result in zip(uuids, results) if result is None
+        ]
+        archived = {}
+        if missing:
+            heights = [
+                self._find_archived_height(uuid=uuid) for uuid in missing
+            ]
+            blocks = self._get_archived_blocks(heights=heights)
+            for uuid, height in zip(missing, heights):
+                # The archive's index is only trusted once the Block is read
+                if str(blocks[height].uuid) != uuid:
+                    raise ValueError('No Block with UUID {}'.format(uuid))
+                archived[uuid] = blocks[height]
+        return [
+            self._block_from_context(context=json.loads(result))
+            if result is not None else archived[uuid]
+            for uuid, result in zip(uuids, results)
+        ]
+
+    def _find_archived_height(self, *, uuid):
+        """
+        The chain position of an archived <Block>, looked up in the
+        archive. Segments are named after their first position.
+        """
+        found = None
+        if self.archive is not None:
+            found = self.archive.find_block(uuid=uuid)
+        if found is None:
+            raise ValueError('No Block with UUID {}'.format(uuid))
+        segment_id, position = found
+        height = int(segment_id) + position
+        if height >= self.archived_height():
+            raise ValueError('No Block with UUID {}'.format(uuid))
+        return height
+
+    def _get_archived_blocks(self, *, heights):
+        """
+        Reads archived <Block>s by chain position, keyed by position.
+
+        Positions are grouped by segment and frame, so each frame is read
+        and verified against its segment's checkpoint only once.
+        """
+        if self.archive is None:
+            raise ValueError('Blocks are archived but there is no archive')
+        segment_starts = self._segment_starts(heights=heights)
+        by_segment = {}
+        for height in heights:
+            index = bisect.bisect_right(segment_starts, height) - 1
+            if index < 0:
+                raise ValueError('No archived Block at index {}'.format(
+                    height
+                ))
+            by_segment.setdefault(segment_starts[index], set()).add(height)
+        segment_ids = ['{:012d}'.format(start) for start in by_segment]
+        checkpoints = self.persistence.hmget(
+            STORAGE_KEY_ARCHIVE_SEGMENTS, segment_ids
+        )
+        blocks = {}
+        for segment_id, checkpoint in zip(segment_ids, checkpoints):
+            checkpoint = json.loads(checkpoint.decode('utf-8'))
+            start = checkpoint['start']
+            frame_size = checkpoint['frame_size']
+            frames = {
+                (height - start) // frame_size
+                for height in by_segment[start]
+            }
+            for frame in sorted(frames):
+                frame_blocks = self._read_frame(
+                    segment_id=segment_id, frame=frame, checkpoint=checkpoint
+                )
+                frame_start = start + frame * frame_size
+                for offset, block in enumerate(frame_blocks):
+                    blocks[frame_start + offset] = block
+        missing = set(heights) - set(blocks)
+        if missing:
+            raise ValueError('No archived Block at index {}'.format(
+                min(missing)
+            ))
+        return blocks
+
+    def _segment_starts(self, *, heights):
+        """
+        The sorted first positions of the archive segments. Segments are
+        only ever added after the last one, so the list is cached until a
+        position past the archived height seen last is asked for.
+        """
+        if max(heights) >= self._archived_height_seen:
+            self._archived_height_seen = self.archived_height()
+            self._segment_starts_seen = sorted(
+                int(segment_id) for segment_id in
+                self.persistence.hkeys(STORAGE_KEY_ARCHIVE_SEGMENTS)
+            )
+        return self._segment_starts_seen
+
+    def _read_frame(self, *, segment_id, frame, checkpoint):
+        """
+        Reads a frame of <Block>s from the archive and checks them against
+        the digest kept in the segment's checkpoint.
+        """
+        blocks = self.archive.read_frame(segment_id=segment_id, frame=frame)
+        for block in blocks:
+            if block.hsh and block.hsh != block.hash(block.nonce):
+                raise ValueError(
+                    'Archived Block {} does not match its hash'.format(
+                        block.uuid
+                    )
+                )
+        if _frame_digest(blocks) != checkpoint['frames'][frame]:
+            raise ValueError(
+                'Archive segment {} frame {} does not match its '
+                'checkpoint'.format(segment_id, frame)
+            )
+        return blocks
+
+    def save_blocks_to_db(self, *, blocks):
+        """
+        Stores a batch of <Block>s in Redis in a single transaction, and
+        returns the positions they were stored at. The blocks are not
+        added to self.chain, so arbitrarily long chains can be written
+        batch by batch. Like chain_length, this raises a ValueError for a
+        chain stored without a chain order.
+        """
+        if not blocks:
+            return []
+        heights = self._append_blocks(blocks=blocks)
+        self.current_block_uuid = blocks[-1].uuid
+        self.current_block = blocks[-1]
+        return heights
+
+    def remove_blocks(self, *, heights):
+        """
+        Removes the <Block>s this record saved at positions in the chain
+        from Redis, and makes the Block before them the current one.
+
+        The chain is only shortened if the Blocks are its last ones, so
+        Blocks saved after them by another writer are kept.
+        """
+        heights = sorted(heights)
+        if not heights:
+            return
+        uuids = self.persistence.hmget(STORAGE_KEY_CHAIN, heights)
+
+        def remove(pipeline):
+            length = int(pipeline.get(STORAGE_KEY_CHAIN_LENGTH) or 0)
+            pipeline.multi()
+            for uuid in uuids:
+                if uuid is not None:
+                    pipeline.delete(self._storage_key(uuid.decode('utf-8')))
+            pipeline.hdel(STORAGE_KEY_CHAIN, *heights)
+            if heights == list(range(heights[0], length)):
+                pipeline.set(STORAGE_KEY_CHAIN_LENGTH, heights[0])
+
+        self.persistence.transaction(remove, STORAGE_KEY_CHAIN_LENGTH)
+        if heights[0]:
+            self.current_block = self.get_blocks_by_index(
+                indexes=[heights[0] - 1]
+            )[0]
+            self.current_block_uuid = self.current_block.uuid
+        else:
+            self.current_block = None
+            self.current_block_uuid = None
+
+    def chain_length(self):
+        """
+        The number of <Block>s in the chain order stored in Redis.
+
+        Chains stored before the chain order was kept have Blocks but no
+        order. Rather than treat them as empty, this raises a ValueError
+        until reindex_chain has been run.
+        """
+        length = int(self.persistence.get(STORAGE_KEY_CHAIN_LENGTH) or 0)
+        if not length and self._has_stored_blocks():
+            raise ValueError(
+                'Blocks are stored without a chain order, '
+                'run reindex_chain first'
+            )
+        return length
+
+    def _has_stored_blocks(self):
+        """
+        Whether any <Block> is stored in Redis.
+        """
+        keys = self.persistence.scan_iter(
+            match=self._storage_key('*'), count=BATCH_SIZE
         )
+        return next(keys, None) is not None
+
+    def _scan_blocks(self, *, batch_size=BATCH_SIZE):
+        """
+        Yields every <Block> stored in Redis, in no particular order.
+        """
+        keys = []
+        for key in self.persistence.scan_iter(
+            match=self._storage_key('*'), count=batch_size
+        ):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                for result in self.persistence.mget(keys):
+                    yield self._block_from_context(context=json.loads(result))
+                keys = []
+        if keys:
+            for result in self.persistence.mget(keys):
+                yield self._block_from_context(context=json.loads(result))
+
+    def reindex_chain(self, *, batch_size=BATCH_SIZE):
+        """
+        Rebuilds the stored chain order for a chain stored before the
+        order was kept, by following each Block's previous_hash from the
+        genesis Block.
+
+        Only the uuids and hashes of the Blocks are kept in memory. Raises
+        a ValueError if the stored Blocks do not form a single chain.
+        Returns the number of Blocks in the chain.
+        """
+        if self.persistence.get(STORAGE_KEY_CHAIN_LENGTH):
+            raise ValueError('The chain order is already stored')
+        genesis = []
+        children = {}
+        for block in self._scan_blocks(batch_size=batch_size):
+            hsh = block.hash(block.nonce)
+            if block.hsh and block.hsh != hsh:
+                raise ValueError('Block {} does not match its hash'.format(
+                    block.uuid
+                ))
+            if block.previous_hash is None:
+                genesis.append((str(block.uuid), hsh))
+            elif block.previous_hash in children:
+                raise ValueError(
+                    'More than one Block follows hash {}'.format(
+                        block.previous_hash
+                    )
+                )
+            else:
+                children[block.previous_hash] = (str(block.uuid), hsh)
+        if len(genesis) != 1:
+            raise ValueError(
+                'Expected one genesis Block, found {}'.format(len(genesis))
+            )
+        uuid, hsh = genesis[0]
+        uuids = [uuid]
+        while hsh in children:
+            uuid, hsh = children.pop(hsh)
+            uuids.append(uuid)
+        if children:
+            raise ValueError(
+                '{} Blocks are not linked to the chain'.format(len(children))
+            )
+        for start in range(0, len(uuids), batch_size):
+            pipeline = self.persistence.pipeline()
+            for height in range(start, min(start + batch_size, len(uuids))):
+                pipeline.hset(STORAGE_KEY_CHAIN, height, uuids[height])
+            pipeline.execute()
+        self.persistence.set(STORAGE_KEY_CHAIN_LENGTH, len(uuids))
+        return len(uuids)
+
+    def get_blocks_by_index(self, *, indexes):
+        """
+        Gets the <Block>s at positions in the stored chain with one HMGET
+        of their uuids and one MGET.
+        """
+        if not indexes:
+            return []
+        archived_height = self.archived_height()
+        archived = [index for index in indexes if index < archived_height]
+        stored = [index for index in indexes if index >= archived_height]
+        blocks = {}
+        if archived:
+            blocks.update(self._get_archived_blocks(heights=archived))
+        if stored:
+            uuids = self.persistence.hmget(STORAGE_KEY_CHAIN, stored)
+            if None in uuids:
+                raise ValueError('No Block at index {}'.format(
+                    stored[uuids.index(None)]
+                ))
+            blocks.update(zip(stored, self._get_blocks(
+                uuids=[uuid.decode('utf-8') for uuid in uuids]
+            )))
+        return [blocks[index] for index in indexes]
+
+    def iter_blocks(self, *, start=0, batch_size=BATCH_SIZE):
+        """
+        Yields the <Block>s stored in Redis in chain order, reading
+        batch_size blocks per round trip.
+        """
+        length = self.chain_length()
+        for batch_start in range(start, length, batch_size):
+            indexes = range(batch_start, min(batch_start + batch_size, length))
+            for block in self.get_blocks_by_index(indexes=list(indexes)):
+                yield block
+
+    def archived_height(self):
+        """
+        The number of <Block>s, from the start of the chain, that have been
+        compacted into the archive.
+        """
+        return int(self.persistence.get(STORAGE_KEY_ARCHIVE_HEIGHT) or 0)
+
+    def compact(self, *, before_index=None, keep_last=None,
+                segment_size=BATCH_SIZE, frame_size=FRAME_SIZE):
+        """
+        Moves old <Block>s out of Redis into archive segments. Each Block
+        is verified against the chain before it is archived, and each
+        segment is read back and checked before its Blocks are deleted
+        from Redis.
+
+        Redis keeps only one checkpoint per segment, with a digest of the
+        hashes in every frame, so archived Blocks can still be read and
+        verified. Their chain positions are removed from the chain order,
+        and the stored chain length is left as it was.
+
+        Args:
+            before_index: Archive every Block before this chain position.
+            keep_last: Instead of before_index, keep this many of the most
+                recent Blocks in Redis.
+            segment_size: How many Blocks are stored in each segment.
+            frame_size: How many Blocks are read together from a segment.
+
+        Returns the number of Blocks archived.
+        """
+        if self.archive is None:
+            raise ValueError('An archive is needed to compact the chain')
+        chain_length = self.chain_length()
+        if before_index is None:
+            if keep_last is None:
+                raise ValueError('Either before_index or keep_last is needed')
+            before_index = chain_length - keep_last
+        before_index = min(before_index, chain_length)
+        height = self.archived_height()
+        previous_hash = None
+        if height:
+            previous_block = self.get_blocks_by_index(indexes=[height - 1])[0]
+            previous_hash = previous_block.hash(previous_block.nonce)
+        archived = 0
+        for start in range(height, before_index, segment_size):
+            end = min(start + segment_size, before_index)
+            blocks = list(verify_blocks(
+                self.get_blocks_by_index(indexes=list(range(start, end))),
+                previous_hash=previous_hash
+            ))
+            # Segments are named after their first position, so running
+            # an interrupted compaction again rewrites the same segment.
+            segment_id = '{:012d}'.format(start)
+            frames = [
+                blocks[offset:offset + frame_size]
+                for offset in range(0, len(blocks), frame_size)
+            ]
+            checkpoint = {
+                'start': start,
+                'frame_size': frame_size,
+                'frames': [_frame_digest(frame) for frame in frames],
+            }
+            self.archive.write_segment(segment_id=segment_id, frames=frames)
+            # Read the segment back before the Blocks leave Redis
+            for frame in range(len(frames)):
+                self._read_frame(
+                    segment_id=segment_id, frame=frame, checkpoint=checkpoint
+                )
+            pipeline = self.persistence.pipeline()
+            pipeline.hset(
+                STORAGE_KEY_ARCHIVE_SEGMENTS,
+                segment_id,
+                json.dumps(checkpoint)
+            )
+            for block in blocks:
+                pipeline.delete(self._storage_key(block.uuid))
+            pipeline.hdel(STORAGE_KEY_CHAIN, *range(start, end))
+            pipeline.set(STORAGE_KEY_ARCHIVE_HEIGHT, end)
+            pipeline.execute()
+            previous_hash = blocks[-1].hash(blocks[-1].nonce)
+            archived += len(blocks)
+        return archived
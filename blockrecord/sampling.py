@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import math
+
+"""Probabilities for spot-checking a chain with a random sample."""
+
+DEFAULT_TAMPER_FRACTION = 0.01
+
+
+def _tampered_blocks(chain_length, tamper_fraction):
+    return min(chain_length, max(1, math.ceil(chain_length * tamper_fraction)))
+
+
+def detection_probability(
+    *, chain_length, sample_size, tamper_fraction=DEFAULT_TAMPER_FRACTION
+):
+    """
+    The probability that checking sample_size distinct random blocks finds
+    at least one tampered block, if tamper_fraction of the chain has been
+    tampered with.
+
+    This only counts the sampled blocks themselves. Each check also
+    verifies the link to the previous block, so the real probability is
+    at least this high.
+    """
+    if not chain_length:
+        return 1.0
+    tampered = _tampered_blocks(chain_length, tamper_fraction)
+    sample_size = min(sample_size, chain_length)
+    missed = 1.0
+    for index in range(sample_size):
+        missed *= (chain_length - tampered - index) / (chain_length - index)
+        if missed <= 0:
+            return 1.0
+    return 1.0 - missed
+
+
+def sample_size_for_confidence(
+    *, chain_length, confidence, tamper_fraction=DEFAULT_TAMPER_FRACTION
+):
+    """
+    The smallest number of random blocks to check so that tampering with
+    tamper_fraction of the chain is found with at least this confidence.
+    """
+    if not 0 < confidence < 1:
+        raise ValueError('Confidence must be between 0 and 1')
+    if not chain_length:
+        return 0
+    tampered = _tampered_blocks(chain_length, tamper_fraction)
+    missed = 1.0
+    for index in range(chain_length):
+        missed *= (chain_length - tampered - index) / (chain_length - index)
+        if 1.0 - missed >= confidence:
+            return index + 1
+    return chain_length
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import gzip
+import json
+
+from .block import Block
+from .record import BATCH_SIZE, verify_blocks
+
+"""Streaming export and import of chains as newline-delimited JSON."""
+
+
+def read_blocks(stream, *, use_gzip=False):
+    """
+    Yields <Block> instances from a binary stream of newline-delimited
+    JSON, one line at a time.
+
+    Every line must carry the Block's hash, or the Block could not be
+    verified against it.
+    """
+    if use_gzip:
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            block = Block(**json.loads(line.decode('utf-8')))
+        except (TypeError, ValueError):
+            raise ValueError('Line {} is not a Block'.format(number))
+        if not block.hsh:
+            raise ValueError(
+                'No hash on Block at line {}. Cannot verify'.format(number)
+            )
+        yield block
+
+
+def write_blocks(blocks, stream, *, use_gzip=False):
+    """
+    Writes <Block>s to a binary stream as newline-delimited JSON, one
+    line at a time.
+
+    Returns the number of blocks written.
+    """
+    if use_gzip:
+        stream = gzip.GzipFile(fileobj=stream, mode='wb')
+    count = 0
+    try:
+        for block in blocks:
+            context = block.to_context()
+            # Export the hash that was stored, not one computed from data
+            # that may have been tampered with.
+            context['hsh'] = block.hsh or context['hsh']
+            stream.write(json.dumps(context).encode('utf-8') + b'\n')
+            count += 1
+    finally:
+        if use_gzip:
+            stream.close()
+    return count
+
+
+def export_chain(record, stream, *, use_gzip=False, batch_size=BATCH_SIZE):
+    """
+    Writes every <Block> in a record to a binary stream as
+    newline-delimited JSON, reading from the persistence in batches.
+
+    Returns the number of blocks written.
+    """
+    return write_blocks(
+        record.iter_blocks(batch_size=batch_size), stream, use_gzip=use_gzip
+    )
+
+
+def import_chain(record, stream, *, use_gzip=False, batch_size=BATCH_SIZE):
+    """
+    Reads newline-delimited JSON blocks from a binary stream, verifies
+    each one as it arrives and saves them in the record in batches.
+
+    The imported blocks must continue from the last block stored in the
+    record, if there is one. If any block fails to verify, the batches
+    already saved are removed again with record.remove_blocks, so the
+    stored chain is left as it was. Returns the number of blocks
+    imported.
+    """
+    length = record.chain_length()
+    previous_hash = None
+    if length:
+        last_block = record.get_blocks_by_index(indexes=[length - 1])[0]
+        previous_hash = last_block.hash(last_block.nonce)
+    blocks = verify_blocks(
+        read_blocks(stream, use_gzip=use_gzip), previous_hash=previous_hash
+    )
+    heights = []
+    batch = []
+    try:
+        for block in blocks:
+            batch.append(block)
+            if len(batch) >= batch_size:
+                heights.extend(record.save_blocks_to_db(blocks=batch))
+                batch = []
+        heights.extend(record.save_blocks_to_db(blocks=batch))
+    except Exception:
+        record.remove_blocks(heights=heights)
+        raise
+    return len(heights)
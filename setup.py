@@ -31,6 +31,11 @@ setup(
     author_email='paulandrewhallett@gmail.com',
     url='https://github.com/phalt/blockrecord',
     packages=find_packages(include=['blockrecord']),
+    entry_points={
+        'console_scripts': [
+            'blockrecord=blockrecord.cli:main',
+        ],
+    },
     include_package_data=True,
     install_requires=requirements,
     license="GNU General Public License v3",
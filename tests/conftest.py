@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""Fixtures shared by the `blockrecord` tests."""
+import pytest
+from redis import StrictRedis
+
+from blockrecord import Block
+from blockrecord.record import (
+    STORAGE_KEY,
+    STORAGE_KEY_ARCHIVE_HEIGHT,
+    STORAGE_KEY_ARCHIVE_SEGMENTS,
+    STORAGE_KEY_CHAIN,
+    STORAGE_KEY_CHAIN_LENGTH,
+    STORAGE_KEY_CURRENT_UUID,
+)
+
+
+@pytest.fixture
+def redis_instance():
+    return StrictRedis(
+        host='localhost',
+        port='6379',
+    )
+
+
+@pytest.fixture
+def empty_redis_instance(redis_instance):
+    """
+    A Redis instance with no Blocks or chain order stored, for tests that
+    read back the stored chain.
+    """
+    for key in redis_instance.scan_iter(match='{}::*'.format(STORAGE_KEY)):
+        redis_instance.delete(key)
+    redis_instance.delete(
+        STORAGE_KEY_CHAIN,
+        STORAGE_KEY_CHAIN_LENGTH,
+        STORAGE_KEY_CURRENT_UUID,
+        STORAGE_KEY_ARCHIVE_SEGMENTS,
+        STORAGE_KEY_ARCHIVE_HEIGHT,
+    )
+    return redis_instance
+
+
+@pytest.fixture
+def chain():
+    """
+    A mined chain of ten <Block>s.
+    """
+    genesis_block = Block(data={'value': 'genesis'})
+    previous_hash = genesis_block.mine()
+    chain = [genesis_block]
+    for x in range(9):
+        block = Block(data={'value': x}, previous_hash=previous_hash)
+        previous_hash = block.mine()
+        chain.append(block)
+    return chain
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for compacting old blocks into an archive."""
+import pytest
+
+from blockrecord import BlockRecordRedis, FileArchive
+from blockrecord.record import STORAGE_KEY_CHAIN
+
+
+class CountingArchive(FileArchive):
+    """
+    Counts how many frames are read from the archive.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.frames_read = 0
+
+    def read_frame(self, **kwargs):
+        self.frames_read += 1
+        return super().read_frame(**kwargs)
+
+
+class LossyArchive(FileArchive):
+    """
+    Drops the last Block of every segment it writes.
+    """
+
+    def write_segment(self, *, segment_id, frames):
+        frames[-1] = frames[-1][:-1]
+        super().write_segment(segment_id=segment_id, frames=frames)
+
+
+def test_file_archive_round_trip(chain, tmpdir):
+    archive = FileArchive(directory=str(tmpdir))
+    frames = [chain[:4], chain[4:8], chain[8:]]
+    archive.write_segment(segment_id='000000000000', frames=frames)
+    blocks = archive.read_frame(segment_id='000000000000', frame=1)
+    assert [block.uuid for block in blocks] == [
+        block.uuid for block in chain[4:8]
+    ]
+    # A whole segment reads like an exported chain
+    blocks = archive.read_segment(segment_id='000000000000')
+    assert [block.hsh for block in blocks] == [block.hsh for block in chain]
+    assert archive.find_block(uuid=str(chain[5].uuid)) == ('000000000000', 5)
+    assert archive.find_block(uuid='not archived') is None
+
+
+def test_compacted_blocks_are_read_from_archive(
+    empty_redis_instance, chain, tmpdir
+):
+    archive = FileArchive(directory=str(tmpdir))
+    record = BlockRecordRedis(
+        persistence=empty_redis_instance, chain=chain, archive=archive
+    )
+    record.dump_blocks_to_db()
+    assert record.compact(keep_last=3, segment_size=4, frame_size=2) == 7
+    assert record.archived_height() == 7
+    assert len(tmpdir.listdir('*.ndjson.gz')) == 2
+    # Compacting again only archives new blocks
+    assert record.compact(keep_last=3) == 0
+    # Redis keeps nothing for each archived block
+    assert record.chain_length() == len(chain)
+    assert empty_redis_instance.hlen(STORAGE_KEY_CHAIN) == 3
+    assert empty_redis_instance.get(record._storage_key(chain[0].uuid)) is None
+
+    new_record = BlockRecordRedis(
+        persistence=empty_redis_instance, archive=archive
+    )
+    block = new_record.get_block(uuid=chain[0].uuid)
+    assert block.hash(block.nonce) == chain[0].hsh
+    stored = list(new_record.iter_blocks(batch_size=4))
+    assert [block.hsh for block in stored] == [block.hsh for block in chain]
+    assert new_record.verify_chain_sample(
+        sample_size=len(chain)
+    )['detection_probability'] == 1.0
+
+
+def test_sampled_reads_read_each_frame_once(
+    empty_redis_instance, chain, tmpdir
+):
+    archive = CountingArchive(directory=str(tmpdir))
+    record = BlockRecordRedis(
+        persistence=empty_redis_instance, chain=chain, archive=archive
+    )
+    record.dump_blocks_to_db()
+    record.compact(before_index=8, segment_size=4, frame_size=2)
+    archive.frames_read = 0
+    record.get_blocks_by_index(indexes=[6, 0, 7, 1, 3, 9])
+    # Frames [0, 1], [2, 3] and [6, 7] hold the archived blocks
+    assert archive.frames_read == 3
+
+
+def test_tampered_archive_is_detected(empty_redis_instance, chain, tmpdir):
+    archive = FileArchive(directory=str(tmpdir))
+    record = BlockRecordRedis(
+        persistence=empty_redis_instance, chain=chain, archive=archive
+    )
+    record.dump_blocks_to_db()
+    record.compact(before_index=5)
+
+    blocks = archive.read_segment(segment_id='000000000000')
+    blocks[2].data = {'value': 'tampered'}
+    # Recompute the stored hash too, so only the checkpoint can catch it
+    blocks[2].hsh = blocks[2].hash(blocks[2].nonce)
+    archive.write_segment(segment_id='000000000000', frames=[blocks])
+    new_record = BlockRecordRedis(
+        persistence=empty_redis_instance, archive=archive
+    )
+    with pytest.raises(ValueError):
+        new_record.get_block(uuid=chain[2].uuid)
+
+
+def test_dump_does_not_drop_compacted_chain(
+    empty_redis_instance, chain, tmpdir
+):
+    archive = FileArchive(directory=str(tmpdir))
+    record = BlockRecordRedis(
+        persistence=empty_redis_instance, chain=chain, archive=archive
+    )
+    record.dump_blocks_to_db()
+    record.compact(keep_last=2)
+
+    # A record without a chain has nothing to store
+    new_record = BlockRecordRedis(
+        persistence=empty_redis_instance, archive=archive
+    )
+    new_record.dump_blocks_to_db()
+    with pytest.raises(ValueError):
+        record.dump_blocks_to_db()
+    assert new_record.archived_height() == 8
+    block = new_record.get_block(uuid=chain[0].uuid)
+    assert block.hash(block.nonce) == chain[0].hsh
+
+
+def test_compact_keeps_blocks_that_were_not_archived(
+    empty_redis_instance, chain, tmpdir
+):
+    archive = LossyArchive(directory=str(tmpdir))
+    record = BlockRecordRedis(
+        persistence=empty_redis_instance, chain=chain, archive=archive
+    )
+    record.dump_blocks_to_db()
+    with pytest.raises(ValueError):
+        record.compact(before_index=5)
+    assert record.archived_height() == 0
+    stored = list(record.iter_blocks())
+    assert [block.hsh for block in stored] == [block.hsh for block in chain]
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for compressing Block data in `blockrecord`."""
+import base64
+import json
+import random
+
+import pytest
+
+from blockrecord import Block, LzmaCodec, ZlibCodec, train_dictionary
+from blockrecord.compression import CONTEXT_CODEC_KEY, CONTEXT_PAYLOAD_KEY
+
+
+@pytest.fixture
+def big_data():
+    return [{'user': 'someone', 'action': 'update', 'value': x}
+            for x in range(50)]
+
+
+@pytest.mark.parametrize('codec', [ZlibCodec(), LzmaCodec()])
+def test_codec_round_trip(codec, big_data):
+    context = codec.encode_data(big_data)
+    assert context[CONTEXT_CODEC_KEY] == codec.name
+    assert codec.decode_data(context[CONTEXT_PAYLOAD_KEY]) == big_data
+    assert codec.stats.records_compressed == 1
+    assert codec.stats.ratio > 1
+
+
+def test_small_data_is_stored_raw():
+    codec = ZlibCodec(threshold=256)
+    data = {'small': 'data'}
+    assert codec.encode_data(data) == {'data': data}
+    assert codec.stats.records_raw == 1
+    assert codec.stats.records_compressed == 0
+
+
+def test_data_that_grows_when_encoded_is_stored_raw():
+    # Random strings barely compress, so base64 makes the payload bigger
+    rng = random.Random(0)
+    data = [
+        base64.b64encode(bytes(rng.getrandbits(8) for _ in range(30)))
+        .decode('ascii')
+        for _ in range(50)
+    ]
+    codec = ZlibCodec()
+    assert codec.encode_data(data) == {'data': data}
+    assert codec.stats.records_raw == 1
+    assert codec.stats.ratio == 1.0
+
+
+def test_stats_count_stored_payload_size(big_data):
+    codec = ZlibCodec()
+    context = codec.encode_data(big_data)
+    stored_size = len(json.dumps(context)) - len('{}')
+    assert codec.stats.stored_bytes == stored_size
+    assert codec.stats.raw_bytes == len(json.dumps({'data': big_data})) - 2
+
+
+def test_dictionary_is_part_of_tag(big_data):
+    dictionary = train_dictionary(big_data)
+    codec = ZlibCodec(dictionary=dictionary)
+    assert codec.tag.startswith('zlib:')
+    assert codec.tag != ZlibCodec().tag
+    context = codec.encode_data(big_data)
+    assert context[CONTEXT_CODEC_KEY] == codec.tag
+    assert codec.decode_data(context[CONTEXT_PAYLOAD_KEY]) == big_data
+
+
+def test_dictionary_improves_small_payloads(big_data):
+    data = [{'user': 'someone', 'action': 'update', 'value': 1000 + x}
+            for x in range(5)]
+    plain = ZlibCodec(threshold=0)
+    trained = ZlibCodec(threshold=0, dictionary=train_dictionary(big_data))
+    plain.encode_data(data)
+    trained.encode_data(data)
+    assert trained.stats.stored_bytes < plain.stats.stored_bytes
+
+
+def test_compression_does_not_change_hash(big_data):
+    block = Block(data=big_data)
+    block.mine()
+    codec = ZlibCodec()
+    context = codec.encode_data(block.data)
+    restored = Block(
+        uuid=block.uuid,
+        data=codec.decode_data(context[CONTEXT_PAYLOAD_KEY]),
+        previous_hash=block.previous_hash,
+        nonce=block.nonce,
+    )
+    assert restored.hash(restored.nonce) == block.hsh
@@ -3,17 +3,9 @@
 
 """Tests for `blockrecord` using redis as a datastore."""
 import pytest
-from redis import StrictRedis
 
-from blockrecord import Block, BlockRecordRedis
-
-
-@pytest.fixture
-def redis_instance():
-    return StrictRedis(
-        host='localhost',
-        port='6379',
-    )
+from blockrecord import Block, BlockRecordRedis, LzmaCodec, ZlibCodec
+from blockrecord.record import STORAGE_KEY_CHAIN, STORAGE_KEY_CHAIN_LENGTH
 
 
 def test_init_block_record_redis(redis_instance):
@@ -21,8 +13,8 @@ def test_init_block_record_redis(redis_instance):
     assert record.current_block_uuid is None
 
 
-def test_generate_genesis_block_and_save_it_return_it(redis_instance):
-    record = BlockRecordRedis(persistence=redis_instance)
+def test_generate_genesis_block_and_save_it_return_it(empty_redis_instance):
+    record = BlockRecordRedis(persistence=empty_redis_instance)
     genesis = record.create_new_block(data={'genesis': 'block'})
     assert isinstance(genesis, Block)
     genesis.mine()
@@ -46,3 +38,132 @@ def test_verify_chain_works_with_big_list_of_blocks(redis_instance):
 
     record = BlockRecordRedis(persistence=redis_instance, chain=chain)
     assert record.verify_chain()
+
+
+def test_compressed_blocks_round_trip_with_mixed_codecs(
+    empty_redis_instance
+):
+    data = [{'value': x, 'description': 'repetitive'} for x in range(50)]
+    zlib_record = BlockRecordRedis(
+        persistence=empty_redis_instance, compression=ZlibCodec()
+    )
+    zlib_block = zlib_record.create_new_block(data=data)
+    zlib_block.mine()
+    zlib_record.save_block_to_db(block=zlib_block)
+    assert zlib_record.compression.stats.records_compressed == 1
+
+    lzma_record = BlockRecordRedis(
+        persistence=empty_redis_instance, compression=LzmaCodec()
+    )
+    lzma_block = lzma_record.create_new_block(data=data)
+    lzma_block.mine()
+    lzma_record.save_block_to_db(block=lzma_block)
+
+    # A record without compression can still read both blocks
+    record = BlockRecordRedis(persistence=empty_redis_instance)
+    for block in [zlib_block, lzma_block]:
+        stored = record.get_block(uuid=block.uuid)
+        assert stored.data == data
+        assert stored.hash(stored.nonce) == block.hsh
+
+
+def test_verify_chain_sample_reads_stored_chain(empty_redis_instance, chain):
+    record = BlockRecordRedis(persistence=empty_redis_instance, chain=chain)
+    record.dump_blocks_to_db()
+    result = record.verify_chain_sample(sample_size=len(chain))
+    assert result['sample_size'] == len(chain)
+    assert result['detection_probability'] == 1.0
+
+
+def test_reindex_chain_stored_without_chain_order(
+    empty_redis_instance, chain
+):
+    record = BlockRecordRedis(persistence=empty_redis_instance, chain=chain)
+    record.dump_blocks_to_db()
+    # Chains stored before the chain order was kept have no order
+    empty_redis_instance.delete(STORAGE_KEY_CHAIN, STORAGE_KEY_CHAIN_LENGTH)
+    with pytest.raises(ValueError):
+        list(record.iter_blocks())
+
+    assert record.reindex_chain(batch_size=3) == len(chain)
+    stored = list(record.iter_blocks())
+    assert [block.uuid for block in stored] == [block.uuid for block in chain]
+
+
+def test_dump_refuses_to_replace_stored_chain(empty_redis_instance, chain):
+    record = BlockRecordRedis(persistence=empty_redis_instance, chain=chain)
+    record.dump_blocks_to_db()
+    # Storing the same chain again, or a longer one, is fine
+    record.dump_blocks_to_db()
+
+    other = BlockRecordRedis(
+        persistence=empty_redis_instance, chain=chain[:4]
+    )
+    with pytest.raises(ValueError):
+        other.dump_blocks_to_db()
+    other = BlockRecordRedis(
+        persistence=empty_redis_instance, chain=chain[1:]
+    )
+    with pytest.raises(ValueError):
+        other.dump_blocks_to_db()
+    assert record.chain_length() == len(chain)
+    stored = list(record.iter_blocks())
+    assert [block.uuid for block in stored] == [block.uuid for block in chain]
+
+
+def test_save_refuses_chain_stored_without_chain_order(
+    empty_redis_instance, chain
+):
+    record = BlockRecordRedis(
+        persistence=empty_redis_instance, chain=chain[:2]
+    )
+    record.dump_blocks_to_db()
+    empty_redis_instance.delete(STORAGE_KEY_CHAIN, STORAGE_KEY_CHAIN_LENGTH)
+    # Saving would hide the stored Blocks behind a new chain order
+    with pytest.raises(ValueError):
+        record.save_block_to_db(block=chain[2])
+    with pytest.raises(ValueError):
+        record.save_blocks_to_db(blocks=chain[2:])
+    assert empty_redis_instance.get(record._storage_key(chain[2].uuid)) is None
+    assert record.reindex_chain() == 2
+
+
+def test_concurrent_saves_take_different_positions(
+    empty_redis_instance, chain, monkeypatch
+):
+    first = BlockRecordRedis(persistence=empty_redis_instance)
+    second = BlockRecordRedis(persistence=empty_redis_instance)
+    transaction = empty_redis_instance.transaction
+    interleaved = []
+
+    def transaction_with_other_writer(func, *watches):
+        def append(pipeline):
+            func(pipeline)
+            # Another writer saves after this one read the chain length
+            if not interleaved:
+                interleaved.append(True)
+                second.save_blocks_to_db(blocks=chain[1:2])
+        return transaction(append, *watches)
+
+    monkeypatch.setattr(
+        empty_redis_instance, 'transaction', transaction_with_other_writer
+    )
+    assert first.save_blocks_to_db(blocks=chain[:1]) == [1]
+    assert first.chain_length() == 2
+    stored = first.get_blocks_by_index(indexes=[0, 1])
+    assert [block.uuid for block in stored] == [chain[1].uuid, chain[0].uuid]
+
+
+def test_remove_blocks_keeps_blocks_saved_after_them(
+    empty_redis_instance, chain
+):
+    first = BlockRecordRedis(persistence=empty_redis_instance)
+    second = BlockRecordRedis(persistence=empty_redis_instance)
+    heights = first.save_blocks_to_db(blocks=chain[:5])
+    second.save_blocks_to_db(blocks=chain[5:])
+    first.remove_blocks(heights=heights)
+    assert first.chain_length() == len(chain)
+    assert first.current_block is None
+    assert empty_redis_instance.get(first._storage_key(chain[0].uuid)) is None
+    block = second.get_block(uuid=chain[5].uuid)
+    assert block.hash(block.nonce) == chain[5].hsh
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for spot-checking a chain with a random sample."""
+import random
+
+import pytest
+
+from blockrecord import AbstractBlockRecord
+from blockrecord.sampling import (
+    detection_probability,
+    sample_size_for_confidence,
+)
+
+
+class InMemoryBlockRecord(AbstractBlockRecord):
+    """
+    Keeps the chain in memory, using the default AbstractBlockRecord reads.
+    """
+
+    def _get_current_block_uuid(self):
+        return None
+
+    def _generate_current_block(self):
+        return None
+
+    def save_block_to_db(self, *, block):
+        self.chain.append(block)
+
+    def get_block(self, *, uuid):
+        return next(block for block in self.chain if block.uuid == uuid)
+
+    def dump_blocks_to_db(self):
+        pass
+
+
+def test_detection_probability():
+    assert detection_probability(
+        chain_length=100, sample_size=100, tamper_fraction=0.01
+    ) == 1.0
+    assert detection_probability(
+        chain_length=100, sample_size=1, tamper_fraction=0.01
+    ) == pytest.approx(0.01)
+    assert detection_probability(
+        chain_length=100, sample_size=0, tamper_fraction=0.01
+    ) == 0.0
+
+
+def test_sample_size_for_confidence():
+    size = sample_size_for_confidence(
+        chain_length=1000000, confidence=0.99, tamper_fraction=0.01
+    )
+    # Close to log(0.01) / log(0.99) for a very long chain
+    assert size == pytest.approx(459, abs=2)
+    assert detection_probability(
+        chain_length=1000000, sample_size=size, tamper_fraction=0.01
+    ) >= 0.99
+
+
+def test_verify_chain_sample(chain):
+    record = InMemoryBlockRecord(persistence=None, chain=chain)
+    result = record.verify_chain_sample(sample_size=5, rng=random.Random(1))
+    assert result['sample_size'] == 5
+    assert result['chain_length'] == len(chain)
+    assert 0 < result['detection_probability'] < 1
+
+
+def test_verify_chain_sample_detects_tampering(chain):
+    chain[4].data = {'value': 'tampered'}
+    record = InMemoryBlockRecord(persistence=None, chain=chain)
+    with pytest.raises(ValueError):
+        record.verify_chain_sample(confidence=0.999999)
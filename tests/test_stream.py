@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for streaming chains to and from newline-delimited JSON."""
+import io
+import json
+
+import pytest
+
+from blockrecord import (
+    BlockRecordRedis,
+    export_chain,
+    import_chain,
+    verify_blocks,
+)
+from blockrecord.cli import main
+from blockrecord.stream import read_blocks, write_blocks
+
+
+def _ndjson(chain):
+    stream = io.BytesIO()
+    for block in chain:
+        stream.write(json.dumps(block.to_context()).encode('utf-8') + b'\n')
+    stream.seek(0)
+    return stream
+
+
+def test_verify_blocks_passes_valid_chain(chain):
+    assert list(verify_blocks(chain)) == chain
+
+
+def test_verify_blocks_detects_changed_data(chain):
+    chain[2].data = {'value': 'tampered'}
+    with pytest.raises(ValueError):
+        list(verify_blocks(chain))
+
+
+def test_verify_blocks_detects_broken_link(chain):
+    chain[3].previous_hash = chain[1].hsh
+    chain[3].hsh = None
+    with pytest.raises(ValueError):
+        list(verify_blocks(chain))
+
+
+def test_read_blocks(chain):
+    blocks = list(read_blocks(_ndjson(chain)))
+    assert [block.uuid for block in blocks] == [block.uuid for block in chain]
+    assert [block.hsh for block in blocks] == [block.hsh for block in chain]
+
+
+def test_read_blocks_requires_hash(chain):
+    stream = _ndjson(chain)
+    lines = stream.getvalue().splitlines()
+    context = json.loads(lines[-1].decode('utf-8'))
+    del context['hsh']
+    lines[-1] = json.dumps(context).encode('utf-8')
+    with pytest.raises(ValueError):
+        list(read_blocks(io.BytesIO(b'\n'.join(lines))))
+
+
+def test_import_rejects_blocks_without_hash(empty_redis_instance, chain):
+    stream = _ndjson(chain)
+    context = json.loads(stream.getvalue().splitlines()[0].decode('utf-8'))
+    del context['hsh']
+    record = BlockRecordRedis(persistence=empty_redis_instance)
+    with pytest.raises(ValueError):
+        import_chain(record, io.BytesIO(json.dumps(context).encode('utf-8')))
+    assert record.chain_length() == 0
+
+
+def test_cli_verify_file(chain, tmpdir):
+    path = tmpdir.join('chain.ndjson')
+    path.write_binary(_ndjson(chain).getvalue())
+    assert main(['verify', str(path)]) == 0
+    chain[1].data = {'value': 'tampered'}
+    path.write_binary(_ndjson(chain).getvalue())
+    with pytest.raises(SystemExit):
+        main(['verify', str(path)])
+
+
+@pytest.mark.parametrize('use_gzip', [False, True])
+def test_import_then_export_chain(empty_redis_instance, chain, use_gzip):
+    stream = io.BytesIO()
+    write_blocks(chain, stream, use_gzip=use_gzip)
+    stream.seek(0)
+    record = BlockRecordRedis(persistence=empty_redis_instance)
+    count = import_chain(record, stream, use_gzip=use_gzip, batch_size=3)
+    assert count == len(chain)
+    assert record.current_block.uuid == chain[-1].uuid
+
+    exported = io.BytesIO()
+    count = export_chain(record, exported, use_gzip=use_gzip, batch_size=3)
+    assert count == len(chain)
+    exported.seek(0)
+    blocks = list(read_blocks(exported, use_gzip=use_gzip))
+    assert [block.hsh for block in blocks] == [block.hsh for block in chain]
+
+
+def test_import_must_link_to_stored_chain(empty_redis_instance, chain):
+    record = BlockRecordRedis(persistence=empty_redis_instance, chain=chain)
+    record.dump_blocks_to_db()
+    stream = io.BytesIO()
+    export_chain(record, stream)
+
+    # Importing the same chain again does not continue from its last block
+    stream.seek(0)
+    new_record = BlockRecordRedis(persistence=empty_redis_instance)
+    with pytest.raises(ValueError):
+        import_chain(new_record, stream)
+    assert new_record.chain_length() == len(chain)
+
+
+def test_failed_import_is_rolled_back(empty_redis_instance, chain):
+    chain[3].data = {'value': 'tampered'}
+    record = BlockRecordRedis(persistence=empty_redis_instance)
+    with pytest.raises(ValueError):
+        import_chain(record, _ndjson(chain), batch_size=2)
+    assert record.chain_length() == 0
+    assert record.current_block is None
+    assert empty_redis_instance.get(record._storage_key(chain[0].uuid)) is None
+
+
+def test_cli_verify_fails_without_blocks(tmpdir):
+    path = tmpdir.join('empty.ndjson')
+    path.write_binary(b'')
+    with pytest.raises(SystemExit):
+        main(['verify', str(path)])
+
+
+def test_cli_import_reports_bad_file(empty_redis_instance, tmpdir):
+    path = tmpdir.join('bad.ndjson')
+    path.write_binary(b'not json\n')
+    with pytest.raises(SystemExit):
+        main(['import', str(path)])
+
+
+def test_cli_reports_missing_file(empty_redis_instance, tmpdir):
+    path = tmpdir.join('missing.ndjson')
+    with pytest.raises(SystemExit):
+        main(['import', str(path)])
+    with pytest.raises(SystemExit):
+        main(['export', str(tmpdir.join('missing', 'chain.ndjson'))])
+
+
+def test_cli_reports_unreachable_redis():
+    with pytest.raises(SystemExit):
+        main(['--redis-url', 'redis://localhost:1/0', 'export'])